@@ -0,0 +1,37 @@
+"""
+测试共用的假嵌入模型和夹具
+"""
+import sys
+import types
+import zlib
+from typing import List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_core.embeddings import Embeddings
+
+class FakeEmbeddings(Embeddings):
+    """按文本哈希生成固定向量的嵌入模型"""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.random(16).astype("float32").tolist()
+
+@pytest.fixture
+def vector_store_cls(monkeypatch):
+    """用假嵌入模型替换 local_embeddings 后导入 VectorStore，无需 sentence_transformers"""
+    local_embeddings = types.ModuleType("local_embeddings")
+    local_embeddings.LocalEmbeddings = FakeEmbeddings
+    monkeypatch.setitem(sys.modules, "local_embeddings", local_embeddings)
+    sys.modules.pop("vector_store", None)
+
+    import vector_store
+    yield vector_store.VectorStore
+    sys.modules.pop("vector_store", None)
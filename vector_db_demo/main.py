@@ -8,13 +8,27 @@ from typing import List, Dict, Any
 
 from custom_llm import CustomLLM
 from local_embeddings import LocalEmbeddings
-from vector_store import VectorStore
+from vector_store import DOCSTORE_FORMATS, VectorStore, get_collection_path
+from sqlite_docstore import SQLITE_DOCSTORE_FILE, migrate_pickle_docstore
 from rag_system import RAGSystem
 from sample_data import load_sample_data
 
+def positive_int(value):
+    """解析正整数参数"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须为正整数: {value}")
+    return number
+
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description="向量数据库和检索器示例")
+    parser.add_argument(
+        "--docstore",
+        choices=DOCSTORE_FORMATS,
+        default="pickle",
+        help="文档存储格式，sqlite会自动迁移已有的 index.pkl"
+    )
     
     # 子命令
     subparsers = parser.add_subparsers(dest="command", help="选择要执行的操作")
@@ -40,6 +54,15 @@ def parse_arguments():
     # 测试LLM
     subparsers.add_parser("test-llm", help="测试语言模型连接")
     
+    # 集合统计
+    stats_parser = subparsers.add_parser("stats", help="查看向量数据库集合统计信息")
+    stats_parser.add_argument("--probe", action="store_true", help="对采样向量进行检索延迟和召回率探测")
+    stats_parser.add_argument("--sample-size", type=positive_int, default=100, help="探测采样向量数量")
+    stats_parser.add_argument("--k", type=positive_int, default=10, help="探测时返回结果数量")
+    
+    # 迁移文档存储
+    subparsers.add_parser("migrate", help="将 index.pkl 文档存储迁移为SQLite格式")
+    
     return parser.parse_args()
 
 def test_llm():
@@ -49,15 +72,82 @@ def test_llm():
     response = llm.invoke("你好，请简短自我介绍")
     print(f"模型响应: {response.content}")
 
+def migrate_collection():
+    """将默认集合的 index.pkl 迁移为SQLite文档存储，出错时直接抛出"""
+    collection_path = get_collection_path()
+    pickle_file = os.path.join(collection_path, "index.pkl")
+    docstore_file = os.path.join(collection_path, SQLITE_DOCSTORE_FILE)
+    if not os.path.exists(pickle_file) and os.path.exists(docstore_file):
+        print(f"集合已使用SQLite文档存储，无需迁移: {collection_path}")
+        return
+    
+    count = migrate_pickle_docstore(collection_path)
+    print(f"已迁移 {count} 个文档到 {SQLITE_DOCSTORE_FILE}，原文件备份为 index.pkl.bak")
+
+def format_bytes(size):
+    """将字节数格式化为可读字符串"""
+    if size is None:
+        return "不存在"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def print_stats(stats: Dict[str, Any]):
+    """打印集合统计信息"""
+    print(f"集合: {stats['collection_name']} ({stats['collection_path']})")
+    print(f"向量数量: {stats['vector_count']}")
+    print(f"文档数量: {stats['document_count']}")
+    print(f"向量维度: {stats['dimension']}")
+    print(f"索引类型: {stats['index_type']}")
+    print(f"文档存储格式: {stats['docstore_format']}")
+    print(f"索引参数: {stats['index_params']}")
+    
+    print("磁盘占用:")
+    for file_name, size in stats["disk_usage"].items():
+        print(f"  {file_name}: {format_bytes(size)}")
+    
+    memory = stats["memory_estimate"]
+    print(f"估算内存: {format_bytes(memory['total'])} "
+          f"(索引 {format_bytes(memory['index'])}, 文档 {format_bytes(memory['docstore'])})")
+    
+    print("元数据字段基数:")
+    for key, count in stats["metadata_cardinality"].items():
+        print(f"  {key}: {count}")
+    
+    print(f"加载耗时: {stats['load_time'] * 1000:.1f} ms")
+    print(f"平均分块长度: {stats['avg_chunk_length']:.1f} 字符")
+    
+    probe = stats.get("probe")
+    if probe:
+        print("检索探测:")
+        if "error" in probe:
+            print(f"  {probe['error']}")
+        elif probe["sample_size"]:
+            print(f"  采样数量: {probe['sample_size']}, k={probe['k']}")
+            print(f"  延迟: 平均 {probe['latency_ms_avg']:.3f} ms, "
+                  f"P50 {probe['latency_ms_p50']:.3f} ms, P95 {probe['latency_ms_p95']:.3f} ms")
+            print(f"  召回率@{probe['k']}(对比精确检索): {probe['recall_at_k']:.2%}")
+            print(f"  自身命中率: {probe['self_hit_rate']:.2%}")
+
 def main():
     """主程序入口"""
     args = parse_arguments()
     
+    if args.command == "migrate":
+        # 迁移只需读取一次 index.pkl，无需加载嵌入模型和向量存储
+        migrate_collection()
+        return
+    
     # 创建嵌入模型
     embedding_model = LocalEmbeddings()
     
     # 创建向量存储
-    vector_store = VectorStore(embedding_model=embedding_model)
+    vector_store = VectorStore(
+        embedding_model=embedding_model,
+        docstore_format=args.docstore
+    )
     
     # 创建RAG系统
     rag = RAGSystem(vector_store=vector_store)
@@ -110,6 +200,15 @@ def main():
         # 测试LLM
         test_llm()
     
+    elif args.command == "stats":
+        # 集合统计
+        stats = vector_store.stats(
+            probe=args.probe,
+            sample_size=args.sample_size,
+            k=args.k
+        )
+        print_stats(stats)
+    
     else:
         print("请指定要执行的操作。使用 --help 查看帮助。")
 
@@ -0,0 +1,236 @@
+"""
+SQLite文档存储
+替代FAISS默认的pickle文档存储，文档内容按需加载
+"""
+import os
+import json
+import pickle
+import sqlite3
+import zlib
+from typing import Dict, Iterator, List, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# 集合目录下的SQLite文档存储文件名
+SQLITE_DOCSTORE_FILE = "docstore.sqlite"
+
+def _check_json_value(value, path: str) -> None:
+    """检查元数据能否无损地保存为JSON，不能时抛出ValueError"""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _check_json_value(item, f"{path}[{i}]")
+        return
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise ValueError(f"元数据字段 {path} 的键 {key!r} 不是字符串，无法保存到SQLite文档存储")
+            _check_json_value(item, f"{path}.{key}")
+        return
+    # 元组、日期、字节串等类型经JSON转换后会改变类型，直接拒绝
+    raise ValueError(
+        f"元数据字段 {path} 的类型 {type(value).__name__} 无法无损保存到SQLite文档存储，"
+        "仅支持 str/int/float/bool/None 及其组成的 list/dict"
+    )
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """基于嵌入式SQLite的文档存储，按ID检索时才反序列化文档"""
+
+    def __init__(self, db_path: str = ":memory:", compress: bool = True):
+        """初始化文档存储，默认使用内存数据库，调用persist后才写入文件"""
+        self.db_path = db_path
+        self.compress = compress
+        self.connection = self._connect(db_path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                metadata TEXT NOT NULL,
+                compressed INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS positions (
+                pos INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL
+            );
+            """
+        )
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        """打开数据库连接"""
+        # LangChain检索链可能在线程池中调用search
+        return sqlite3.connect(db_path, check_same_thread=False)
+
+    def _encode(self, doc: Document) -> tuple:
+        """将文档编码为数据库行"""
+        content = doc.page_content.encode("utf-8")
+        if self.compress:
+            content = zlib.compress(content)
+        _check_json_value(doc.metadata, "metadata")
+        metadata = json.dumps(doc.metadata, ensure_ascii=False)
+        return content, metadata, int(self.compress)
+
+    @staticmethod
+    def _decode(content: bytes, metadata: str, compressed: int) -> Document:
+        """将数据库行解码为文档"""
+        if compressed:
+            content = zlib.decompress(content)
+        return Document(page_content=content.decode("utf-8"), metadata=json.loads(metadata))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """添加文档"""
+        rows = [(doc_id, *self._encode(doc)) for doc_id, doc in texts.items()]
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO documents (id, content, metadata, compressed) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Tried to add ids that already exist: {e}")
+
+    def delete(self, ids: List) -> None:
+        """删除文档"""
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM documents WHERE id = ?",
+                [(doc_id,) for doc_id in ids]
+            )
+
+    def search(self, search: str) -> Union[str, Document]:
+        """按ID加载单个文档"""
+        row = self.connection.execute(
+            "SELECT content, metadata, compressed FROM documents WHERE id = ?",
+            (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._decode(*row)
+
+    def iter_documents(self) -> Iterator[Document]:
+        """按位置顺序遍历所有文档"""
+        cursor = self.connection.execute(
+            "SELECT d.content, d.metadata, d.compressed FROM positions p "
+            "JOIN documents d ON d.id = p.doc_id ORDER BY p.pos"
+        )
+        for row in cursor:
+            yield self._decode(*row)
+
+    def __len__(self) -> int:
+        """文档数量"""
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def position_count(self) -> int:
+        """已保存的向量位置数量"""
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def truncate_positions(self, count: int) -> None:
+        """删除从count开始的位置及其文档，用于丢弃未完成保存的新增向量"""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM documents WHERE id IN (SELECT doc_id FROM positions WHERE pos >= ?)",
+                (count,)
+            )
+            self.connection.execute("DELETE FROM positions WHERE pos >= ?", (count,))
+
+    def load_index_to_docstore_id(self) -> Dict[int, str]:
+        """加载FAISS向量位置到文档ID的映射"""
+        cursor = self.connection.execute("SELECT pos, doc_id FROM positions ORDER BY pos")
+        return {pos: doc_id for pos, doc_id in cursor}
+
+    def save_index_to_docstore_id(self, index_to_docstore_id: Dict[int, str]) -> None:
+        """保存位置映射，新增向量时只追加新的位置"""
+        stored_count = self.position_count()
+        last_row = self.connection.execute(
+            "SELECT doc_id FROM positions WHERE pos = ?", (stored_count - 1,)
+        ).fetchone()
+
+        # 已保存的映射是当前映射的前缀时只写入新增部分，否则（如删除后重排）整体重写
+        is_prefix = stored_count <= len(index_to_docstore_id) and (
+            stored_count == 0
+            or (last_row is not None and index_to_docstore_id.get(stored_count - 1) == last_row[0])
+        )
+        with self.connection:
+            if not is_prefix:
+                self.connection.execute("DELETE FROM positions")
+                stored_count = 0
+            self.connection.executemany(
+                "INSERT INTO positions (pos, doc_id) VALUES (?, ?)",
+                [
+                    (pos, doc_id)
+                    for pos, doc_id in index_to_docstore_id.items()
+                    if pos >= stored_count
+                ]
+            )
+
+    def persist(self, db_path: str) -> None:
+        """将当前数据库完整写入新文件，之后的修改直接写入该文件"""
+        # 不覆盖已有文件，避免新建的集合替换掉之前保存的文档
+        if os.path.exists(db_path):
+            raise FileExistsError(f"文档存储文件已存在: {db_path}")
+
+        # 先写入临时文件，完成后再替换，避免中断留下不完整的文件
+        tmp_file = db_path + ".tmp"
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        target = self._connect(tmp_file)
+        try:
+            self.connection.backup(target)
+        finally:
+            target.close()
+
+        self.connection.close()
+        os.replace(tmp_file, db_path)
+        self.db_path = db_path
+        self.connection = self._connect(db_path)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self.connection.close()
+
+def migrate_pickle_docstore(
+    collection_path: str,
+    compress: bool = True,
+    batch_size: int = 1000
+) -> int:
+    """将集合的 index.pkl 迁移为SQLite文档存储，返回迁移的文档数量"""
+    pickle_file = os.path.join(collection_path, "index.pkl")
+    db_file = os.path.join(collection_path, SQLITE_DOCSTORE_FILE)
+    tmp_file = db_file + ".tmp"
+
+    # index.pkl 由 FAISS.save_local 写入，内容为 (docstore, index_to_docstore_id)
+    with open(pickle_file, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    # 先写入临时文件，完成后再替换，避免迁移中断留下不完整的文档存储
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    sqlite_docstore = SQLiteDocstore(tmp_file, compress=compress)
+    count = 0
+    try:
+        doc_ids = list(index_to_docstore_id.values())
+        for start in range(0, len(doc_ids), batch_size):
+            batch = {}
+            for doc_id in doc_ids[start:start + batch_size]:
+                doc = docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    batch[doc_id] = doc
+            sqlite_docstore.add(batch)
+            count += len(batch)
+        sqlite_docstore.save_index_to_docstore_id(index_to_docstore_id)
+    except Exception:
+        sqlite_docstore.close()
+        os.remove(tmp_file)
+        raise
+    sqlite_docstore.close()
+
+    # 已有的文档存储与 index.pkl 不一致，备份而不是直接覆盖
+    if os.path.exists(db_file):
+        os.replace(db_file, db_file + ".stale")
+    os.replace(tmp_file, db_file)
+    # 保留原文件作为备份
+    os.replace(pickle_file, pickle_file + ".bak")
+    return count
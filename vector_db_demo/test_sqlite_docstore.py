@@ -0,0 +1,241 @@
+"""
+SQLite文档存储测试
+覆盖迁移、重新加载、追加和删除后的位置映射
+"""
+import os
+import sqlite3
+
+import faiss
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from conftest import FakeEmbeddings
+from sqlite_docstore import SQLITE_DOCSTORE_FILE, SQLiteDocstore, migrate_pickle_docstore
+
+TEXTS = ["向量数据库", "检索增强生成", "文本嵌入", "相似度搜索"]
+
+def load_sqlite_store(collection_path: str) -> FAISS:
+    """按SQLite格式加载集合"""
+    docstore = SQLiteDocstore(os.path.join(collection_path, SQLITE_DOCSTORE_FILE))
+    return FAISS(
+        FakeEmbeddings(),
+        faiss.read_index(os.path.join(collection_path, "index.faiss")),
+        docstore,
+        docstore.load_index_to_docstore_id()
+    )
+
+def save_sqlite_store(store: FAISS, collection_path: str) -> None:
+    """按SQLite格式保存集合"""
+    store.docstore.save_index_to_docstore_id(store.index_to_docstore_id)
+    faiss.write_index(store.index, os.path.join(collection_path, "index.faiss"))
+
+@pytest.fixture
+def pickle_collection(tmp_path):
+    """FAISS.save_local保存的pickle格式集合"""
+    metadatas = [{"source": f"doc{i}.txt", "page": i} for i in range(len(TEXTS))]
+    store = FAISS.from_texts(TEXTS, FakeEmbeddings(), metadatas=metadatas)
+    store.save_local(str(tmp_path))
+    return str(tmp_path)
+
+def test_migrate_load_search_round_trip(pickle_collection):
+    count = migrate_pickle_docstore(pickle_collection)
+
+    assert count == len(TEXTS)
+    assert sorted(os.listdir(pickle_collection)) == [SQLITE_DOCSTORE_FILE, "index.faiss", "index.pkl.bak"]
+
+    store = load_sqlite_store(pickle_collection)
+    assert len(store.index_to_docstore_id) == store.index.ntotal == len(TEXTS)
+    doc = store.similarity_search("检索增强生成", k=1)[0]
+    assert doc.page_content == "检索增强生成"
+    assert doc.metadata == {"source": "doc1.txt", "page": 1}
+
+def test_append_after_reload(pickle_collection):
+    migrate_pickle_docstore(pickle_collection)
+    store = load_sqlite_store(pickle_collection)
+    store.add_texts(["新增文档"], metadatas=[{"source": "new.txt"}])
+    save_sqlite_store(store, pickle_collection)
+    store.docstore.close()
+
+    reloaded = load_sqlite_store(pickle_collection)
+    assert reloaded.index_to_docstore_id == store.index_to_docstore_id
+    assert reloaded.docstore.position_count() == reloaded.index.ntotal == len(TEXTS) + 1
+    doc = reloaded.similarity_search("新增文档", k=1)[0]
+    assert doc.page_content == "新增文档"
+    assert doc.metadata == {"source": "new.txt"}
+
+def test_rewrite_positions_after_delete(pickle_collection):
+    migrate_pickle_docstore(pickle_collection)
+    store = load_sqlite_store(pickle_collection)
+    # 删除第一个文档后FAISS会重排位置，已保存的映射不再是前缀
+    store.delete([store.index_to_docstore_id[0]])
+    save_sqlite_store(store, pickle_collection)
+    store.docstore.close()
+
+    reloaded = load_sqlite_store(pickle_collection)
+    assert reloaded.index_to_docstore_id == store.index_to_docstore_id
+    assert reloaded.index.ntotal == len(TEXTS) - 1
+    assert [doc.page_content for doc in reloaded.docstore.iter_documents()] == TEXTS[1:]
+    assert reloaded.similarity_search("文本嵌入", k=1)[0].page_content == "文本嵌入"
+
+def test_persist_writes_in_memory_store(tmp_path):
+    docstore = SQLiteDocstore()
+    docstore.add({"a": Document(page_content="内存文档", metadata={"tags": ["x", "y"]})})
+    docstore.save_index_to_docstore_id({0: "a"})
+    db_file = str(tmp_path / SQLITE_DOCSTORE_FILE)
+
+    docstore.persist(db_file)
+    docstore.close()
+
+    reopened = SQLiteDocstore(db_file)
+    assert reopened.load_index_to_docstore_id() == {0: "a"}
+    assert reopened.search("a").metadata == {"tags": ["x", "y"]}
+    assert reopened.search("b") == "ID b not found."
+
+def test_duplicate_ids_rejected():
+    docstore = SQLiteDocstore()
+    docstore.add({"a": Document(page_content="文档")})
+
+    with pytest.raises(ValueError):
+        docstore.add({"a": Document(page_content="重复文档")})
+
+@pytest.mark.parametrize("value", [(1, 2), b"bytes", {1: "非字符串键"}])
+def test_non_json_metadata_rejected(value):
+    docstore = SQLiteDocstore()
+
+    with pytest.raises(ValueError):
+        docstore.add({"a": Document(page_content="文档", metadata={"field": value})})
+
+def test_failed_migration_keeps_pickle(tmp_path):
+    store = FAISS.from_texts(TEXTS, FakeEmbeddings(), metadatas=[{"tags": ("a", "b")}] * len(TEXTS))
+    store.save_local(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        migrate_pickle_docstore(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == ["index.faiss", "index.pkl"]
+
+def test_vector_store_ignores_stale_sqlite_docstore(tmp_path, vector_store_cls):
+    VectorStore = vector_store_cls
+    store = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    store.add_texts(TEXTS)
+    # 残留的SQLite文档存储没有位置映射，不能被当作有效集合加载
+    SQLiteDocstore(os.path.join(store.collection_path, SQLITE_DOCSTORE_FILE)).close()
+
+    reloaded = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    assert reloaded.docstore_format == "pickle"
+    assert reloaded.similarity_search("文本嵌入", k=1)[0].page_content == "文本嵌入"
+
+    reloaded.add_texts(["新增文档"])
+    assert not os.path.exists(os.path.join(store.collection_path, SQLITE_DOCSTORE_FILE))
+
+def test_vector_store_sqlite_created_on_first_save(tmp_path, vector_store_cls):
+    VectorStore = vector_store_cls
+    store = VectorStore(
+        embedding_model=FakeEmbeddings(),
+        persist_directory=str(tmp_path),
+        docstore_format="sqlite"
+    )
+    store.similarity_search("向量数据库")
+    assert os.listdir(store.collection_path) == []
+
+    store.add_texts(TEXTS)
+    reloaded = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    assert reloaded.docstore_format == "sqlite"
+    assert reloaded.vector_store.index.ntotal == len(TEXTS) + 1
+    assert reloaded.similarity_search("文本嵌入", k=1)[0].page_content == "文本嵌入"
+
+def test_vector_store_auto_migrates_pickle_collection(tmp_path, vector_store_cls):
+    VectorStore = vector_store_cls
+    store = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    store.add_texts(TEXTS, [{"source": "doc.txt"}] * len(TEXTS))
+
+    migrated = VectorStore(
+        embedding_model=FakeEmbeddings(),
+        persist_directory=str(tmp_path),
+        docstore_format="sqlite"
+    )
+    assert migrated.docstore_format == "sqlite"
+    assert sorted(os.listdir(migrated.collection_path)) == [
+        SQLITE_DOCSTORE_FILE, "index.faiss", "index.pkl.bak"
+    ]
+    doc = migrated.similarity_search("相似度搜索", k=1)[0]
+    assert doc.page_content == "相似度搜索"
+    assert doc.metadata == {"source": "doc.txt"}
+
+    # 迁移后的集合不指定格式也按SQLite加载
+    migrated.add_texts(["新增文档"])
+    reloaded = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    assert reloaded.docstore_format == "sqlite"
+    assert reloaded.vector_store.index.ntotal == len(TEXTS) + 2
+    assert reloaded.similarity_search("新增文档", k=1)[0].page_content == "新增文档"
+
+def test_persist_refuses_to_overwrite(tmp_path):
+    db_file = str(tmp_path / SQLITE_DOCSTORE_FILE)
+    SQLiteDocstore(db_file).close()
+    docstore = SQLiteDocstore()
+
+    with pytest.raises(FileExistsError):
+        docstore.persist(db_file)
+
+def test_vector_store_inconsistent_sqlite_without_pickle_raises(tmp_path, vector_store_cls):
+    VectorStore = vector_store_cls
+    store = VectorStore(
+        embedding_model=FakeEmbeddings(),
+        persist_directory=str(tmp_path),
+        docstore_format="sqlite"
+    )
+    store.add_texts(TEXTS)
+    store.vector_store.docstore.close()
+    db_file = os.path.join(store.collection_path, SQLITE_DOCSTORE_FILE)
+    # 丢失部分位置映射，文档存储与索引不一致
+    connection = sqlite3.connect(db_file)
+    with connection:
+        connection.execute("DELETE FROM positions WHERE pos >= 2")
+    connection.close()
+
+    for docstore_format in ("pickle", "sqlite"):
+        with pytest.raises(RuntimeError):
+            VectorStore(
+                embedding_model=FakeEmbeddings(),
+                persist_directory=str(tmp_path),
+                docstore_format=docstore_format
+            )
+
+    # 现有文件保持不变
+    assert sorted(os.listdir(store.collection_path)) == [SQLITE_DOCSTORE_FILE, "index.faiss"]
+    assert faiss.read_index(os.path.join(store.collection_path, "index.faiss")).ntotal == len(TEXTS) + 1
+    docstore = SQLiteDocstore(db_file)
+    assert len(docstore) == len(TEXTS) + 1
+    docstore.close()
+
+def test_vector_store_recovers_from_interrupted_save(tmp_path, vector_store_cls, monkeypatch):
+    VectorStore = vector_store_cls
+    store = VectorStore(
+        embedding_model=FakeEmbeddings(),
+        persist_directory=str(tmp_path),
+        docstore_format="sqlite"
+    )
+    store.add_texts(TEXTS)
+
+    # 位置映射已提交但索引写入失败
+    def fail_write_index(index, path):
+        raise OSError("磁盘已满")
+    monkeypatch.setattr(faiss, "write_index", fail_write_index)
+    with pytest.raises(OSError):
+        store.add_texts(["未保存的文档"])
+    monkeypatch.undo()
+    store.vector_store.docstore.close()
+    assert sorted(os.listdir(store.collection_path)) == [SQLITE_DOCSTORE_FILE, "index.faiss"]
+
+    reloaded = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    assert reloaded.docstore_format == "sqlite"
+    assert reloaded.vector_store.index.ntotal == len(TEXTS) + 1
+    assert reloaded.vector_store.docstore.position_count() == len(TEXTS) + 1
+    assert len(reloaded.vector_store.docstore) == len(TEXTS) + 1
+
+    reloaded.add_texts(["新增文档"])
+    again = VectorStore(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    assert again.vector_store.index.ntotal == len(TEXTS) + 2
+    assert again.similarity_search("新增文档", k=1)[0].page_content == "新增文档"
+    assert again.similarity_search("文本嵌入", k=1)[0].page_content == "文本嵌入"
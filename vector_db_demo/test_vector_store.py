@@ -0,0 +1,119 @@
+"""
+向量存储统计测试
+覆盖集合统计、索引参数、内存估算和检索探测
+"""
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from conftest import FakeEmbeddings
+from sqlite_docstore import SQLITE_DOCSTORE_FILE
+
+DIMENSION = 16
+
+def build_index(description: str, count: int = 2000):
+    """按faiss工厂字符串构建并填充索引"""
+    vectors = np.random.default_rng(0).random((count, DIMENSION)).astype("float32")
+    index = faiss.index_factory(DIMENSION, description)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+@pytest.fixture
+def vector_store(tmp_path, vector_store_cls):
+    """包含几条带元数据文本的pickle格式集合"""
+    store = vector_store_cls(embedding_model=FakeEmbeddings(), persist_directory=str(tmp_path))
+    store.add_texts(
+        ["向量数据库", "检索增强生成", "文本嵌入"],
+        [{"source": "a.txt"}, {"source": "b.txt"}, {"source": "a.txt", "page": 1}]
+    )
+    return store
+
+def test_stats_reports_collection(vector_store):
+    stats = vector_store.stats()
+
+    # 集合包含一条初始化文档
+    assert stats["vector_count"] == stats["document_count"] == 4
+    assert stats["dimension"] == DIMENSION
+    assert stats["index_type"] == "IndexFlatL2"
+    assert stats["docstore_format"] == "pickle"
+    assert stats["index_params"]["metric"] == "L2"
+    assert stats["disk_usage"]["index.faiss"] > 0
+    assert stats["disk_usage"]["index.pkl"] > 0
+    assert stats["disk_usage"][SQLITE_DOCSTORE_FILE] is None
+    assert stats["metadata_cardinality"] == {"page": 1, "source": 2}
+    assert stats["avg_chunk_length"] == pytest.approx((5 + 5 + 6 + 4) / 4)
+    assert stats["memory_estimate"]["index"] == 4 * DIMENSION * 4
+    assert stats["memory_estimate"]["total"] == (
+        stats["memory_estimate"]["index"] + stats["memory_estimate"]["docstore"]
+    )
+    assert "probe" not in stats
+
+def test_stats_sqlite_docstore_memory_counts_only_id_map(tmp_path, vector_store_cls):
+    store = vector_store_cls(
+        embedding_model=FakeEmbeddings(),
+        persist_directory=str(tmp_path),
+        docstore_format="sqlite"
+    )
+    store.add_texts(["向量数据库" * 1000])
+
+    stats = store.stats()
+    assert stats["docstore_format"] == "sqlite"
+    assert stats["memory_estimate"]["docstore"] == store._estimate_id_map_memory(
+        store.vector_store.index_to_docstore_id
+    )
+
+def test_stats_probe_flat_index(vector_store):
+    probe = vector_store.stats(probe=True, sample_size=10, k=2)["probe"]
+
+    assert probe["sample_size"] == 4
+    assert probe["k"] == 2
+    assert probe["recall_at_k"] == 1.0
+    assert probe["self_hit_rate"] == 1.0
+    assert probe["latency_ms_p95"] >= probe["latency_ms_p50"] > 0
+
+@pytest.mark.parametrize("sample_size, k", [(0, 10), (-1, 10), (10, 0)])
+def test_stats_rejects_non_positive_probe_arguments(vector_store, sample_size, k):
+    with pytest.raises(ValueError):
+        vector_store.stats(probe=True, sample_size=sample_size, k=k)
+
+def test_probe_ivf_recall_against_exact_search(vector_store_cls):
+    index = build_index("IVF64,Flat")
+    index.nprobe = 1
+
+    probe = vector_store_cls._probe_search(index, sample_size=50, k=10)
+    # 采样向量总能在自己所属的倒排列表中找到自身，但只搜索一个列表会漏掉部分近邻
+    assert probe["self_hit_rate"] == 1.0
+    assert probe["recall_at_k"] < 1.0
+
+def test_index_params_ivf_pq(vector_store_cls):
+    index = build_index("IVF16,PQ4x4")
+    index.nprobe = 4
+
+    params = vector_store_cls._index_params(index)
+    assert params["nlist"] == 16
+    assert params["nprobe"] == 4
+    assert params["pq_m"] == 4
+    assert params["pq_nbits"] == 4
+
+def test_index_params_hnsw(vector_store_cls):
+    index = build_index("HNSW8")
+    index.hnsw.efSearch = 32
+
+    params = vector_store_cls._index_params(index)
+    assert params["hnsw_m"] == 8
+    assert params["ef_search"] == 32
+    assert params["storage_type"] == "IndexFlatL2"
+    assert "pq_m" not in params
+
+def test_estimate_index_memory_uses_hnsw_storage(vector_store_cls):
+    flat = build_index("HNSW8")
+    pq = build_index("HNSW8_PQ4x4")
+    links = 2000 * 16 * 4
+
+    assert vector_store_cls._estimate_index_memory(flat) == 2000 * DIMENSION * 4 + links
+    # 4x4位PQ编码每个向量2字节，另加码本
+    assert vector_store_cls._estimate_index_memory(pq) == 2000 * 2 + 4 * 16 * 4 * 4 + links
+    assert vector_store_cls._index_params(pq)["pq_m"] == 4
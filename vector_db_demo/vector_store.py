@@ -3,12 +3,34 @@
 使用FAISS作为向量存储引擎
 """
 import os
+import sys
+import time
 import pickle
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 
 from local_embeddings import LocalEmbeddings
+from sqlite_docstore import SQLITE_DOCSTORE_FILE, SQLiteDocstore, migrate_pickle_docstore
+
+# 支持的文档存储格式
+DOCSTORE_FORMATS = ("pickle", "sqlite")
+
+# 默认的存储目录和集合名称
+DEFAULT_PERSIST_DIRECTORY = "vector_db"
+DEFAULT_COLLECTION_NAME = "default_collection"
+
+def get_collection_path(
+    persist_directory=DEFAULT_PERSIST_DIRECTORY,
+    collection_name=DEFAULT_COLLECTION_NAME
+) -> str:
+    """获取集合目录的绝对路径"""
+    if not os.path.isabs(persist_directory):
+        persist_directory = os.path.join(os.getcwd(), persist_directory)
+    return os.path.join(persist_directory, collection_name)
 
 class VectorStore:
     """向量存储和检索类"""
@@ -16,17 +38,22 @@ class VectorStore:
     def __init__(
         self, 
         embedding_model=None, 
-        persist_directory="vector_db",
-        collection_name="default_collection"
+        persist_directory=DEFAULT_PERSIST_DIRECTORY,
+        collection_name=DEFAULT_COLLECTION_NAME,
+        docstore_format="pickle"
     ):
         """初始化向量存储"""
+        if docstore_format not in DOCSTORE_FORMATS:
+            raise ValueError(f"不支持的文档存储格式: {docstore_format}，可选: {DOCSTORE_FORMATS}")
+        self.docstore_format = docstore_format
+        
         # 确保使用绝对路径
         if not os.path.isabs(persist_directory):
             persist_directory = os.path.join(os.getcwd(), persist_directory)
         
         self.persist_directory = persist_directory
         self.collection_name = collection_name
-        self.collection_path = os.path.join(persist_directory, collection_name)
+        self.collection_path = get_collection_path(persist_directory, collection_name)
         
         # 如果没有提供嵌入模型，则使用默认本地模型
         self.embedding_model = embedding_model or LocalEmbeddings()
@@ -35,14 +62,42 @@ class VectorStore:
         os.makedirs(self.persist_directory, exist_ok=True)
         os.makedirs(self.collection_path, exist_ok=True)
         
-        # 加载或创建向量存储
+        # 加载或创建向量存储，并记录加载耗时
+        start_time = time.perf_counter()
         self.vector_store = self._load_or_create_vector_store()
+        self.load_time = time.perf_counter() - start_time
     
     def _load_or_create_vector_store(self):
         """加载或创建新的向量存储"""
         # FAISS.save_local会保存 index.faiss 和 index.pkl 两个文件
+        # SQLite格式则保存 index.faiss 和 docstore.sqlite
         index_file = os.path.join(self.collection_path, "index.faiss")
+        pickle_file = os.path.join(self.collection_path, "index.pkl")
+        docstore_file = os.path.join(self.collection_path, SQLITE_DOCSTORE_FILE)
+        if not os.path.exists(index_file) and os.path.exists(docstore_file):
+            # 没有索引文件的文档存储无法加载，备份后移除，避免首次保存时被拒绝覆盖
+            os.replace(docstore_file, docstore_file + ".stale")
+            print(f"缺少 index.faiss，已将 {SQLITE_DOCSTORE_FILE} 备份为 {SQLITE_DOCSTORE_FILE}.stale")
+        
         if os.path.exists(index_file):
+            # 集合已是SQLite格式时按SQLite加载，出错时直接抛出，不会覆盖已有数据
+            vector_store = self._load_sqlite_vector_store(index_file, docstore_file, pickle_file)
+            
+            # 指定SQLite格式时自动迁移已有的 index.pkl，迁移失败同样直接抛出
+            if (
+                vector_store is None
+                and self.docstore_format == "sqlite"
+                and os.path.exists(pickle_file)
+            ):
+                print(f"正在将 index.pkl 迁移为SQLite文档存储: {self.collection_path}")
+                count = migrate_pickle_docstore(self.collection_path)
+                print(f"已迁移 {count} 个文档，原文件备份为 index.pkl.bak")
+                vector_store = self._load_sqlite_vector_store(index_file, docstore_file, pickle_file)
+            
+            if vector_store is not None:
+                self.docstore_format = "sqlite"
+                return vector_store
+            
             try:
                 print(f"正在加载现有向量存储: {self.collection_path}")
                 # 允许反序列化
@@ -55,10 +110,60 @@ class VectorStore:
                 print(f"加载向量存储失败: {e}")
                 print("将创建新的向量存储")
         
-        # 创建空的向量存储
+        return self._create_vector_store()
+    
+    def _load_sqlite_vector_store(
+        self,
+        index_file: str,
+        docstore_file: str,
+        pickle_file: str
+    ) -> Optional[FAISS]:
+        """加载SQLite格式的集合，文档存储不存在、或与索引不一致但可回退到 index.pkl 时返回None"""
+        if not os.path.exists(docstore_file):
+            return None
+        
+        index = faiss.read_index(index_file)
+        docstore = SQLiteDocstore(docstore_file)
+        try:
+            # 位置映射与索引向量数一致才视为有效的SQLite集合
+            position_count = docstore.position_count()
+            if position_count != index.ntotal:
+                message = (f"{SQLITE_DOCSTORE_FILE} 的位置映射数量({position_count})"
+                           f"与索引向量数量({index.ntotal})不一致")
+                if os.path.exists(pickle_file):
+                    print(f"{message}，改为加载 index.pkl")
+                    docstore.close()
+                    return None
+                # 保存时先写位置映射再替换索引，多出的位置来自未完成的保存，可以丢弃
+                if position_count > index.ntotal:
+                    print(f"{message}，丢弃未完成保存的 {position_count - index.ntotal} 个位置")
+                    docstore.truncate_positions(index.ntotal)
+                else:
+                    # 没有 index.pkl 可回退时不能新建集合，否则保存时会覆盖现有数据
+                    raise RuntimeError(f"{message}，且没有 index.pkl 可回退: {self.collection_path}")
+            
+            print(f"正在加载现有向量存储: {self.collection_path}")
+            return FAISS(
+                self.embedding_model,
+                index,
+                docstore,
+                docstore.load_index_to_docstore_id()
+            )
+        except Exception:
+            docstore.close()
+            raise
+    
+    def _create_vector_store(self):
+        """创建空的向量存储"""
+        kwargs = {}
+        if self.docstore_format == "sqlite":
+            # 新建的文档存储先放在内存中，首次保存时才写入文件
+            kwargs["docstore"] = SQLiteDocstore()
+        
         return FAISS.from_documents(
             documents=[Document(page_content="初始化文档", metadata={})],
-            embedding=self.embedding_model
+            embedding=self.embedding_model,
+            **kwargs
         )
     
     def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]] = None) -> List[str]:
@@ -92,6 +197,223 @@ class VectorStore:
         """执行带评分的相似度搜索"""
         return self.vector_store.similarity_search_with_score(query, k=k)
     
+    def stats(self, probe: bool = False, sample_size: int = 100, k: int = 10) -> Dict[str, Any]:
+        """统计集合信息，可选对采样向量进行检索延迟和召回率探测"""
+        if probe and (sample_size < 1 or k < 1):
+            raise ValueError(f"sample_size 和 k 必须为正整数: sample_size={sample_size}, k={k}")
+        
+        index = self.vector_store.index
+        base_index = faiss.downcast_index(index)
+        
+        # SQLite文档存储中的文档只在命中时加载，不计入常驻内存
+        lazy_docstore = isinstance(self.vector_store.docstore, SQLiteDocstore)
+        
+        # 遍历文档，统计分块长度和元数据字段基数
+        chunk_lengths = []
+        field_values: Dict[str, set] = {}
+        docstore_memory = 0
+        for doc in self._iter_documents():
+            chunk_lengths.append(len(doc.page_content))
+            if not lazy_docstore:
+                docstore_memory += self._estimate_document_memory(doc)
+            for key, value in doc.metadata.items():
+                field_values.setdefault(key, set()).add(repr(value))
+        
+        # 内存文档存储自身的ID字典和FAISS位置到ID的映射
+        if not lazy_docstore:
+            docstore_memory += sys.getsizeof(getattr(self.vector_store.docstore, "_dict", {}))
+        docstore_memory += self._estimate_id_map_memory(self.vector_store.index_to_docstore_id)
+        
+        index_memory = self._estimate_index_memory(base_index)
+        
+        stats = {
+            "collection_name": self.collection_name,
+            "collection_path": self.collection_path,
+            "vector_count": index.ntotal,
+            "document_count": len(chunk_lengths),
+            "dimension": index.d,
+            "index_type": type(base_index).__name__,
+            "docstore_format": self.docstore_format,
+            "index_params": self._index_params(base_index),
+            "disk_usage": {
+                "index.faiss": self._file_size("index.faiss"),
+                "index.pkl": self._file_size("index.pkl"),
+                SQLITE_DOCSTORE_FILE: self._file_size(SQLITE_DOCSTORE_FILE),
+            },
+            "memory_estimate": {
+                "index": index_memory,
+                "docstore": docstore_memory,
+                "total": index_memory + docstore_memory,
+            },
+            "metadata_cardinality": {
+                key: len(values) for key, values in sorted(field_values.items())
+            },
+            "load_time": self.load_time,
+            "avg_chunk_length": sum(chunk_lengths) / len(chunk_lengths) if chunk_lengths else 0.0,
+        }
+        
+        if probe:
+            stats["probe"] = self._probe_search(index, sample_size, k)
+        
+        return stats
+    
+    def _iter_documents(self) -> Iterator[Document]:
+        """遍历文档存储中的所有文档"""
+        docstore = self.vector_store.docstore
+        # SQLite文档存储可一次查询顺序读取
+        if isinstance(docstore, SQLiteDocstore):
+            yield from docstore.iter_documents()
+            return
+        
+        for doc_id in self.vector_store.index_to_docstore_id.values():
+            doc = docstore.search(doc_id)
+            if isinstance(doc, Document):
+                yield doc
+    
+    def _file_size(self, file_name: str) -> Optional[int]:
+        """获取集合目录下文件的磁盘大小，文件不存在时返回None"""
+        file_path = os.path.join(self.collection_path, file_name)
+        if os.path.exists(file_path):
+            return os.path.getsize(file_path)
+        return None
+    
+    @staticmethod
+    def _index_params(index) -> Dict[str, Any]:
+        """提取索引的主要参数"""
+        if index.metric_type == faiss.METRIC_L2:
+            metric = "L2"
+        elif index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            metric = "inner_product"
+        else:
+            metric = str(index.metric_type)
+        
+        params = {"metric": metric, "is_trained": bool(index.is_trained)}
+        storage = VectorStore._storage_index(index)
+        if storage is not None:
+            params["storage_type"] = type(storage).__name__
+        # IVF类索引
+        if hasattr(index, "nlist"):
+            params["nlist"] = index.nlist
+            params["nprobe"] = index.nprobe
+        # PQ压缩参数，HNSW_PQ的PQ在storage中
+        pq = getattr(index, "pq", None) or getattr(storage, "pq", None)
+        if pq is not None:
+            params["pq_m"] = pq.M
+            params["pq_nbits"] = pq.nbits
+        # HNSW图参数
+        if hasattr(index, "hnsw"):
+            params["hnsw_m"] = index.hnsw.nb_neighbors(1)
+            params["ef_construction"] = index.hnsw.efConstruction
+            params["ef_search"] = index.hnsw.efSearch
+        return params
+    
+    @staticmethod
+    def _estimate_document_memory(doc: Document) -> int:
+        """估算单个文档对象占用的内存（字节），不含嵌套元数据的深层对象"""
+        memory = sys.getsizeof(doc) + sys.getsizeof(doc.page_content) + sys.getsizeof(doc.metadata)
+        # Document对象的属性字典
+        memory += sys.getsizeof(getattr(doc, "__dict__", {}))
+        for key, value in doc.metadata.items():
+            memory += sys.getsizeof(key) + sys.getsizeof(value)
+        return memory
+    
+    @staticmethod
+    def _estimate_id_map_memory(index_to_docstore_id: Dict[int, str]) -> int:
+        """估算位置到文档ID映射占用的内存（字节）"""
+        memory = sys.getsizeof(index_to_docstore_id)
+        for pos, doc_id in index_to_docstore_id.items():
+            memory += sys.getsizeof(pos) + sys.getsizeof(doc_id)
+        return memory
+    
+    @staticmethod
+    def _storage_index(index):
+        """获取HNSW等索引实际保存向量的storage索引，没有时返回None"""
+        storage = getattr(index, "storage", None)
+        if storage is None:
+            return None
+        # storage是基类代理对象，需要向下转型才能取得code_size和pq
+        return faiss.downcast_index(storage)
+    
+    @staticmethod
+    def _estimate_index_memory(index) -> int:
+        """估算索引常驻内存（字节），只计算向量编码、PQ码本、IVF质心与ID和HNSW第0层邻接表"""
+        storage = VectorStore._storage_index(index)
+        code_size = getattr(index, "code_size", None) or getattr(storage, "code_size", None)
+        if not code_size:
+            # 无法获取编码大小时按float32平铺向量估算
+            code_size = index.d * 4
+        
+        memory = index.ntotal * code_size
+        # PQ码本
+        pq = getattr(index, "pq", None) or getattr(storage, "pq", None)
+        if pq is not None:
+            memory += pq.M * pq.ksub * pq.dsub * 4
+        # IVF需要额外存储质心和倒排列表中的ID
+        if hasattr(index, "nlist"):
+            memory += index.nlist * index.d * 4 + index.ntotal * 8
+        # HNSW第0层的邻接表
+        if hasattr(index, "hnsw"):
+            memory += index.ntotal * index.hnsw.nb_neighbors(0) * 4
+        return memory
+    
+    @staticmethod
+    def _reconstruct_vectors(index) -> np.ndarray:
+        """重建索引中的全部向量，压缩索引得到的是解码后的近似向量"""
+        try:
+            return index.reconstruct_n(0, index.ntotal)
+        except RuntimeError:
+            base_index = faiss.downcast_index(index)
+            if not hasattr(base_index, "make_direct_map"):
+                raise
+            # IVF索引需要先建立直接映射才能按位置重建
+            base_index.make_direct_map()
+            return index.reconstruct_n(0, index.ntotal)
+    
+    @staticmethod
+    def _probe_search(index, sample_size: int, k: int) -> Dict[str, Any]:
+        """用库中采样向量作为查询，测量检索延迟，并与精确检索结果对比计算召回率"""
+        sample_size = min(sample_size, index.ntotal)
+        if sample_size == 0:
+            return {"sample_size": 0}
+        
+        try:
+            vectors = np.ascontiguousarray(VectorStore._reconstruct_vectors(index), dtype="float32")
+        except RuntimeError as e:
+            return {"sample_size": 0, "error": f"索引不支持向量重建: {e}"}
+        
+        rng = np.random.default_rng(0)
+        sample_ids = rng.choice(index.ntotal, size=sample_size, replace=False)
+        queries = vectors[sample_ids]
+        k = min(k, index.ntotal)
+        
+        # 以相同度量方式对全部向量做暴力检索，作为召回率的基准
+        exact_index = faiss.IndexFlat(index.d, index.metric_type)
+        exact_index.add(vectors)
+        _, exact_ids = exact_index.search(queries, k)
+        
+        latencies = []
+        overlap = 0
+        self_hits = 0
+        for sample_id, query, expected_ids in zip(sample_ids, queries, exact_ids):
+            start_time = time.perf_counter()
+            _, result_ids = index.search(query.reshape(1, -1), k)
+            latencies.append(time.perf_counter() - start_time)
+            overlap += len(set(result_ids[0]) & set(expected_ids))
+            if sample_id in result_ids[0]:
+                self_hits += 1
+        
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            "sample_size": sample_size,
+            "k": k,
+            "latency_ms_avg": float(latencies_ms.mean()),
+            "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+            "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+            # 检索结果与精确检索前k个结果的重合比例
+            "recall_at_k": overlap / (sample_size * k),
+            # 采样向量检索到自身的比例
+            "self_hit_rate": self_hits / sample_size,
+        }
 
     def _save_vector_store(self):
         """将向量存储保存到本地"""
@@ -103,7 +425,24 @@ class VectorStore:
                     print(f"创建向量存储目录: {self.collection_path}")
                     os.makedirs(self.collection_path, exist_ok=True)
                 
-                self.vector_store.save_local(self.collection_path)
+                docstore = self.vector_store.docstore
+                docstore_file = os.path.join(self.collection_path, SQLITE_DOCSTORE_FILE)
+                if isinstance(docstore, SQLiteDocstore):
+                    # 新建的集合首次保存时把内存中的文档存储写入文件
+                    if docstore.db_path != docstore_file:
+                        docstore.persist(docstore_file)
+                    # 文档在添加时已写入SQLite，这里只需保存新增的位置映射和索引
+                    # 索引最后写入，中断时多出的位置会在下次加载时丢弃
+                    docstore.save_index_to_docstore_id(self.vector_store.index_to_docstore_id)
+                    index_file = os.path.join(self.collection_path, "index.faiss")
+                    faiss.write_index(self.vector_store.index, index_file + ".tmp")
+                    os.replace(index_file + ".tmp", index_file)
+                else:
+                    # 残留的SQLite文档存储与当前集合不一致，备份后移除，避免之后被误加载
+                    if os.path.exists(docstore_file):
+                        os.replace(docstore_file, docstore_file + ".stale")
+                        print(f"已将不一致的 {SQLITE_DOCSTORE_FILE} 备份为 {SQLITE_DOCSTORE_FILE}.stale")
+                    self.vector_store.save_local(self.collection_path)
                 print(f"向量存储已保存到 {self.collection_path}")
             except Exception as e:
                 print(f"保存向量存储时出错: {str(e)}")
@@ -117,12 +456,12 @@ class VectorStore:
         """删除整个集合"""
         import shutil
         if os.path.exists(self.collection_path):
+            # 删除前先关闭SQLite连接
+            if isinstance(self.vector_store.docstore, SQLiteDocstore):
+                self.vector_store.docstore.close()
             shutil.rmtree(self.collection_path)
             print(f"已删除集合: {self.collection_name}")
             # 重新创建一个空的向量存储
-            self.vector_store = FAISS.from_documents(
-                documents=[Document(page_content="初始化文档", metadata={})],
-                embedding=self.embedding_model
-            )
+            self.vector_store = self._create_vector_store()
         else:
             print(f"集合不存在: {self.collection_name}")